@@ -431,6 +431,28 @@ class MSRSyncBenchmarker:
         except Exception as e:
             print(f"  os.walk: failed ({e})")
 
+    def benchmark_crawler_backends(self):
+        """Compare the msrsync stat'ing crawlers: threaded scandir, statx and batched io_uring statx"""
+        print("\n=== msrsync Crawler Backends ===")
+
+        if msrsync3 is None:
+            print("  msrsync3 not found, skipping")
+            return
+
+        for name in ['parallel', 'statx', 'io_uring']:
+            if not msrsync3.crawler_available(name):
+                print(f"  {name}: not available")
+                continue
+            counters = msrsync3.collections.Counter()
+            crawler = msrsync3.get_crawler(name, counters=counters)
+            start_time = time.time()
+            file_count = sum(1 for _ in crawler(str(self.source_dir), sizes=True))
+            duration = time.time() - start_time
+            self.results.append(BenchResult(f'msrsync_{name}_crawl', duration, 0, file_count / duration, 0, 0, 0, 0))
+            batches = counters['io_uring_batches']
+            detail = f", {batches} io_uring batches" if batches else ""
+            print(f"  {name}: {duration:.3f}s ({file_count} entries{detail})")
+
     def benchmark_compression_levels(self):
         """Test different compression levels for network optimization"""
         print("\n=== Compression Level Testing ===")
@@ -522,6 +544,57 @@ class MSRSyncBenchmarker:
                                 print(f"    Performance plateau detected at {procs} processes (improvement: {improvement:.1%})")
                                 break
 
+    def _drop_caches(self):
+        """Flush the page cache so that the sources are read from the disk, return False if not allowed"""
+        try:
+            os.sync()
+            with open('/proc/sys/vm/drop_caches', 'w') as f:
+                f.write('3\n')
+            return True
+        except OSError:
+            return False
+
+    def benchmark_bucket_order(self):
+        """Compare the bucket entries orders on cold caches (physical order matters on mechanical drives)"""
+        print("\n=== Bucket Order Comparison ===")
+
+        for order in ['name', 'inode', 'extent']:
+            dest_test = self.dest_dir / f'order_test_{order}'
+            if dest_test.exists():
+                shutil.rmtree(dest_test)
+
+            cold = self._drop_caches()
+            if not cold:
+                print("  Cannot drop the page cache (needs root), the sources may be read from memory")
+
+            cmd = (
+                f"{self.msrsync_path} -p 2 -f 1000 --bucket-order {order} "
+                f"--rsync '-aS --numeric-ids' "
+                f"{self.source_dir}/ {dest_test}/"
+            )
+
+            result = self.run_command(cmd)
+            if result['returncode'] == 0:
+                total_size = self._get_directory_size(self.source_dir)
+                file_count = self._count_files(self.source_dir)
+                throughput = (total_size / 1024 / 1024) / result['duration']
+                files_per_sec = file_count / result['duration']
+
+                self.results.append(
+                    BenchResult(
+                        f'order_{order}{"_cold" if cold else ""}',
+                        result['duration'],
+                        throughput,
+                        files_per_sec,
+                        result['cpu_percent'],
+                        result['memory_mb'],
+                        result['network_mb_s'],
+                        0,
+                    )
+                )
+
+                print(f"  {order}: {result['duration']:.1f}s, {throughput:.1f} MB/s, {files_per_sec:.0f} files/s")
+
     def benchmark_network_patterns(self):
         """Test different network usage patterns"""
         print("\n=== Network Pattern Analysis ===")
@@ -757,10 +830,12 @@ def main():
     print("Starting network-aware msrsync benchmarks...")
 
     benchmarker.benchmark_crawl_methods()
+    benchmarker.benchmark_crawler_backends()
 
     if not args.quick:
         benchmarker.benchmark_compression_levels()
         benchmarker.benchmark_process_scaling()
+        benchmarker.benchmark_bucket_order()
         benchmarker.benchmark_network_patterns()
         benchmarker.benchmark_memory_usage()
     else:
@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+
+import contextlib
+import io
+import os
+import pytest
+import shutil
+import stat
+import tempfile
+import time
+from collections import Counter
+from .test_utils import import_msrsync3
+
+msrsync3 = import_msrsync3()
+_create_fake_tree = msrsync3._create_fake_tree
+rmtree_onerror = msrsync3.rmtree_onerror
+crawl = msrsync3.crawl
+crawl_parallel = msrsync3.crawl_parallel
+crawl_scandir = msrsync3.crawl_scandir
+crawl_with_find = msrsync3.crawl_with_find
+crawl_with_fd = msrsync3.crawl_with_fd
+crawl_statx = msrsync3.crawl_statx
+crawl_io_uring = msrsync3.crawl_io_uring
+iter_nul_records = msrsync3.iter_nul_records
+buckets = msrsync3.buckets
+sources_buckets = msrsync3.sources_buckets
+select_crawler = msrsync3.select_crawler
+CRAWLERS = msrsync3.CRAWLERS
+CrawlGovernor = msrsync3.CrawlGovernor
+FilterRules = msrsync3.FilterRules
+
+
+class TestCrawlers:
+    """
+    Test that the crawl engines produce the same entries as crawl()
+    """
+
+    def setup_method(self):
+        """create a temporary fake tree"""
+        self.src = tempfile.mkdtemp(prefix='msrsync_testcrawl_')
+        _create_fake_tree(self.src, total_entries=1234, max_entries_per_level=123, max_depth=5, files_pct=80)
+        os.mkdir(os.path.join(self.src, 'empty'))
+        os.symlink(self.src, os.path.join(self.src, 'dirlink'))
+
+    def teardown_method(self):
+        """remove the temporary fake tree"""
+        if os.path.exists(self.src):
+            shutil.rmtree(self.src, onerror=rmtree_onerror)
+
+    @staticmethod
+    def _entries(crawled):
+        return sorted((size, rpath) for size, rpath, _ in crawled)
+
+    def _reference(self, **kwargs):
+        return self._entries(crawl(self.src, relative=True, **kwargs))
+
+    def test_scandir_crawl(self):
+        """scandir crawl yields the same entries as crawl()"""
+        assert self._entries(crawl_scandir(self.src, relative=True)) == self._reference()
+
+    def test_scandir_crawl_exclude_caches(self):
+        """scandir crawl honours cache exclusions"""
+        os.mkdir(os.path.join(self.src, '.cache'))
+        open(os.path.join(self.src, '.cache', 'data'), 'w').close()
+        open(os.path.join(self.src, 'file.swp'), 'w').close()
+        expected = self._reference(exclude_caches=True)
+        assert self._entries(crawl_scandir(self.src, relative=True, exclude_caches=True)) == expected
+
+    def test_scandir_crawl_without_sizes(self):
+        """scandir crawl without sizes yields the same paths with a 0 size"""
+        expected = sorted((0, rpath) for _, rpath in self._reference())
+        assert self._entries(crawl_scandir(self.src, relative=True, sizes=False)) == expected
+
+    def test_parallel_crawl(self):
+        """parallel crawl yields the same entries as crawl()"""
+        assert self._entries(crawl_parallel(self.src, relative=True, threads=4)) == self._reference()
+
+    def test_parallel_crawl_single_thread(self):
+        """parallel crawl with a single thread"""
+        assert self._entries(crawl_parallel(self.src, relative=True, threads=1)) == self._reference()
+
+    def test_parallel_crawl_exclude_caches(self):
+        """parallel crawl honours cache exclusions"""
+        os.mkdir(os.path.join(self.src, '.cache'))
+        open(os.path.join(self.src, '.cache', 'data'), 'w').close()
+        open(os.path.join(self.src, 'file.swp'), 'w').close()
+        expected = self._reference(exclude_caches=True)
+        assert self._entries(crawl_parallel(self.src, relative=True, exclude_caches=True, threads=4)) == expected
+
+    def test_parallel_crawl_early_close(self):
+        """closing the generator early stops the crawl threads"""
+        gen = crawl_parallel(self.src, relative=True, threads=4)
+        next(gen)
+        gen.close()
+
+    def test_parallel_buckets(self):
+        """buckets() built from the parallel crawler hold every entry once"""
+        entries = [entry for _, _, bucket in buckets(self.src, 100, 1024**3, crawler='parallel', crawl_threads=4) for entry in bucket]
+        assert len(entries) == len(set(entries)) == len(self._reference())
+
+    @pytest.mark.skipif(not msrsync3.crawler_available('statx'), reason='statx is not available')
+    def test_statx_crawl(self):
+        """statx crawl yields the same entries as crawl() and counts its calls"""
+        counters = Counter()
+        assert self._entries(crawl_statx(self.src, relative=True, counters=counters)) == self._reference()
+        assert counters['statx_calls'] == len(self._reference()) and counters['statx_ns'] > 0
+        assert self._entries(crawl_statx(self.src, relative=True, sizes=False)) == sorted((0, rpath) for _, rpath in self._reference())
+
+    @pytest.mark.skipif(not msrsync3.crawler_available('statx'), reason='statx is not available')
+    def test_statx_crawl_metadata(self):
+        """statx crawl metadata matches lstat"""
+        for _, rpath, st in crawl_statx(self.src, relative=True, metadata=True, dont_sync=True):
+            ref = os.lstat(os.fsencode(self.src) + rpath)
+            assert (st.st_mode, st.st_ino, st.st_dev, st.st_nlink, st.st_uid, st.st_size, st.st_mtime_ns, st.st_ctime_ns) == (
+                ref.st_mode,
+                ref.st_ino,
+                ref.st_dev,
+                ref.st_nlink,
+                ref.st_uid,
+                ref.st_size,
+                ref.st_mtime_ns,
+                ref.st_ctime_ns,
+            )
+
+    @pytest.mark.skipif(not msrsync3.crawler_available('io_uring'), reason='io_uring is not available')
+    def test_io_uring_crawl(self, monkeypatch):
+        """io_uring crawl yields the same entries as crawl(), by batches spanning several directories"""
+        monkeypatch.setattr(msrsync3, 'IO_URING_ENTRIES', 8)
+        counters = Counter()
+        assert self._entries(crawl_io_uring(self.src, relative=True, counters=counters)) == self._reference()
+        assert counters['io_uring_ops'] == len(self._reference())
+        assert counters['io_uring_batches'] == -(-counters['io_uring_ops'] // 8)
+
+    @pytest.mark.skipif(not msrsync3.crawler_available('io_uring'), reason='io_uring is not available')
+    def test_io_uring_crawl_metadata(self):
+        """io_uring crawl metadata matches lstat"""
+        for _, rpath, st in crawl_io_uring(self.src, relative=True, metadata=True):
+            ref = os.lstat(os.fsencode(self.src) + rpath)
+            assert (st.st_mode, st.st_ino, st.st_dev, st.st_nlink, st.st_size, st.st_mtime_ns) == (
+                ref.st_mode,
+                ref.st_ino,
+                ref.st_dev,
+                ref.st_nlink,
+                ref.st_size,
+                ref.st_mtime_ns,
+            )
+
+    def test_find_crawl(self):
+        """find crawl yields the same entries as crawl()"""
+        assert self._entries(crawl_with_find(self.src, relative=True)) == self._reference()
+
+    def test_find_crawl_metadata(self):
+        """find crawl metadata matches lstat"""
+        for _, rpath, st in crawl_with_find(self.src, relative=True, metadata=True):
+            ref = os.lstat(os.fsencode(self.src) + rpath)
+            assert (st.st_mode, st.st_ino, st.st_dev, st.st_nlink, st.st_size) == (
+                ref.st_mode,
+                ref.st_ino,
+                ref.st_dev,
+                ref.st_nlink,
+                ref.st_size,
+            )
+            assert st.st_mtime_ns // 1000 == ref.st_mtime_ns // 1000
+
+    def test_find_crawl_without_sizes(self):
+        """find crawl without sizes yields the same paths with a 0 size"""
+        expected = sorted((0, rpath) for _, rpath in self._reference())
+        assert self._entries(crawl_with_find(self.src, relative=True, sizes=False)) == expected
+
+    def test_find_crawl_trailing_slash(self):
+        """find crawl of a source with a trailing slash"""
+        src = self.src + os.sep
+        assert self._entries(crawl_with_find(src, relative=True)) == self._entries(crawl(src, relative=True))
+
+    def test_undecodable_names(self):
+        """every crawler yields undecodable names as the same bytes"""
+        os.mkdir(os.path.join(os.fsencode(self.src), b'caf\xe9'))
+        open(os.path.join(os.fsencode(self.src), b'caf\xe9', b'\xff\xfe'), 'w').close()
+        expected = self._reference()
+        assert (0, b'/caf\xe9/\xff\xfe') in expected
+        for crawler in crawl_scandir, crawl_with_find, crawl_parallel, crawl_statx, crawl_io_uring:
+            assert self._entries(crawler(self.src, relative=True)) == expected
+
+    def test_find_crawl_exclude_caches(self):
+        """find crawl honours cache exclusions"""
+        os.mkdir(os.path.join(self.src, '.cache'))
+        open(os.path.join(self.src, '.cache', 'data'), 'w').close()
+        open(os.path.join(self.src, 'file.swp'), 'w').close()
+        expected = self._reference(exclude_caches=True)
+        assert self._entries(crawl_with_find(self.src, relative=True, exclude_caches=True)) == expected
+
+    def test_crawl_filters(self):
+        """every crawler applies the filter rules and prunes the excluded directories"""
+        os.makedirs(os.path.join(self.src, 'sub', 'build', 'deep'))
+        for name in 'a.o', 'keep.o', os.path.join('sub', 'build', 'deep', 'file'), os.path.join('sub', 'b.o'):
+            open(os.path.join(self.src, name), 'w').close()
+        for rules in [(False, '*.o'), (False, 'build/')], [(True, 'keep.o'), (False, '*.o'), (False, '/empty/'), (False, 'sub/build/')]:
+            filters = FilterRules(rules)
+            expected = self._reference(filters=filters)
+            rpaths = [rpath for _, rpath in expected]
+            assert not any(rpath.endswith(b'.o') and not rpath.endswith(b'keep.o') for rpath in rpaths)
+            assert not any(b'/build' in rpath for rpath in rpaths)
+            for crawler in crawl_scandir, crawl_with_find, crawl_parallel, crawl_statx, crawl_io_uring:
+                assert self._entries(crawler(self.src, relative=True, filters=filters)) == expected
+
+    def test_excluded_content_dirs(self):
+        """a directory left empty by its excluded subdirectories is yielded, not one with excluded files only"""
+        for name in os.path.join('cachedir', '.cache', 'data'), os.path.join('swpdir', 'file.swp'), os.path.join('ruledir', 'build', 'file'):
+            os.makedirs(os.path.join(self.src, os.path.dirname(name)), exist_ok=True)
+            open(os.path.join(self.src, name), 'w').close()
+        filters = FilterRules([(False, 'ruledir/build/')])
+        expected = self._reference(exclude_caches=True, filters=filters)
+        rpaths = [rpath for _, rpath in expected]
+        assert b'/cachedir' in rpaths and b'/ruledir' in rpaths and b'/swpdir' not in rpaths
+        for crawler in crawl_scandir, crawl_with_find, crawl_parallel, crawl_statx, crawl_io_uring:
+            assert self._entries(crawler(self.src, relative=True, exclude_caches=True, filters=filters)) == expected
+
+    def test_excluded_root_name(self, tmp_path):
+        """the exclusions do not apply to the source directory itself"""
+        for name, filters in ('foo~', None), ('x.tmp', None), ('build', FilterRules([(False, 'build/')])):
+            for content in True, False:
+                root = tmp_path / ('full' if content else 'empty') / name
+                os.makedirs(root / 'd' if content else root)
+                if content:
+                    (root / 'd' / 'f').write_text('data')
+                expected = [(4, b'/d/f')] if content else [(root.stat().st_size, b'')]
+                for crawler in crawl, crawl_scandir, crawl_with_find, crawl_parallel, crawl_statx, crawl_io_uring:
+                    assert self._entries(crawler(str(root), relative=True, exclude_caches=True, filters=filters)) == expected
+
+    @staticmethod
+    def _mount_point():
+        """return a non empty mount point of the system and its parent directory, on another small file system"""
+        with open('/proc/self/mounts') as mounts:
+            for line in mounts:
+                mount = line.split()[1]
+                parent = os.path.dirname(mount)
+                with contextlib.suppress(OSError):
+                    if parent != '/' and os.stat(parent).st_dev != os.stat(mount).st_dev and os.listdir(mount) and len(os.listdir(parent)) < 1000:
+                        return mount, parent
+        return None, None
+
+    def test_one_file_system(self):
+        """every crawler prunes the mount points of other file systems"""
+        mount, parent = self._mount_point()
+        if mount is None:
+            pytest.skip('no suitable mount point')
+        mount = os.fsencode(mount)
+        assert any(path.startswith(mount + b'/') for _, path, _ in crawl_scandir(parent, sizes=False))
+        filters = FilterRules(one_file_system=True)
+        for crawler in crawl_scandir, crawl_with_find, crawl_parallel, crawl_statx, crawl_io_uring, crawl:
+            for metadata in False, True:
+                paths = [path for _, path, _ in crawler(parent, sizes=False, metadata=metadata, filters=filters)]
+                assert not any(path == mount or path.startswith(mount + b'/') for path in paths), crawler.__name__
+        assert FilterRules(one_file_system=True).find_prune() == ([b'-xdev'], True)
+        assert FilterRules(one_file_system=True).fd_excludes() == ([b'--one-file-system'], True)
+
+    def test_fd_crawl_bytes(self, tmp_path, monkeypatch):
+        """fd crawl yields the files as bytes paths, without the ./ prefix of fd --print0"""
+        fake_fd = tmp_path / 'fd'
+        fake_fd.write_text('#!/bin/sh\nexec find . -type f -print0\n')
+        fake_fd.chmod(0o755)
+        monkeypatch.setenv('PATH', f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+        open(os.path.join(self.src, 'new\nline'), 'w').close()
+        expected = [(size, rpath) for size, rpath in self._reference() if os.path.isfile(os.fsencode(self.src) + rpath)]
+        assert self._entries(crawl_with_fd(self.src, relative=True)) == expected
+
+    def test_nul_records(self):
+        """NUL records are split across read blocks"""
+        stream = io.BytesIO(b'first\0sec\nond\0third')
+        assert list(iter_nul_records(stream, blocksize=4)) == [b'first', b'sec\nond', b'third']
+
+    def test_stat_free_buckets(self):
+        """buckets() without size limit are only cut on the files number"""
+        results = list(buckets(self.src, 100, 0))
+        assert all(bucket_size == 0 for _, bucket_size, _ in results)
+        assert all(files_nr == 100 for files_nr, _, _ in results[:-1])
+        assert sum(files_nr for files_nr, _, _ in results) == len(self._reference())
+
+    def test_hardlink_buckets(self):
+        """all the links of an inode are put in the same bucket"""
+        links = os.path.join(self.src, 'links')
+        os.mkdir(links)
+        for idx in range(5):
+            first = os.path.join(links, f'file{idx}')
+            open(first, 'w').close()
+            for other in range(idx + 1):
+                os.link(first, os.path.join(self.src, f'link{idx}_{other}'))
+        crawl_stats = []
+        results = list(buckets(self.src, 3, 0, crawler='scandir', crawl_stats=crawl_stats, hardlinks=True))
+        inodes = {}
+        for idx, (_, _, bucket) in enumerate(results):
+            for path in bucket:
+                st = os.lstat(os.path.join(os.path.dirname(os.fsencode(self.src)), path))
+                if st.st_nlink > 1 and stat.S_ISREG(st.st_mode):
+                    inodes.setdefault(st.st_ino, set()).add(idx)
+        assert len(inodes) == 5 and all(len(idxs) == 1 for idxs in inodes.values())
+        assert sum(files_nr for files_nr, _, _ in results) == len(self._reference())
+        assert crawl_stats[0]['counters']['hardlink_groups'] == 5
+        assert crawl_stats[0]['counters']['hardlink_files'] == 20
+
+    def test_size_age_buckets(self):
+        """only the files matching the size and age predicates are bucketed, and counted"""
+        old_file, big_file = os.path.join(self.src, 'old'), os.path.join(self.src, 'big')
+        open(old_file, 'w').close()
+        with open(big_file, 'wb') as bfile:
+            bfile.write(b'x' * 4096)
+        past = time.time() - 100 * 86400
+        os.utime(old_file, (past, past))
+        base = os.fsencode(os.path.basename(self.src))
+        for size_age, expected in (
+            (dict(older_than_ns=time.time_ns() - 90 * 86400 * 10**9), [base + b'/old']),
+            (dict(min_size=4096), [base + b'/big']),
+        ):
+            crawl_stats = []
+            entries = [path for _, _, bucket in buckets(self.src, 100, 0, crawl_stats=crawl_stats, size_age=size_age) for path in bucket]
+            assert [path for path in entries if os.path.isfile(os.path.join(os.path.dirname(self.src), os.fsdecode(path)))] == expected
+            counters = crawl_stats[0]['counters']
+            assert counters['size_age_matched'] == 1
+            assert counters['size_age_filtered'] == sum(1 for _, rpath in self._reference() if os.path.isfile(os.fsencode(self.src) + rpath)) - 1
+
+    def test_auto_crawler(self):
+        """auto selection picks an available crawler and reports the crawl rate"""
+        crawl_stats = []
+        results = list(buckets(self.src, 100, 1024**3, crawler='auto', crawl_stats=crawl_stats))
+        assert crawl_stats[0]['crawler'] in crawl_stats[0]['probe']
+        assert crawl_stats[0]['entries'] == sum(files_nr for files_nr, _, _ in results)
+
+    def test_select_crawler(self):
+        """every probed crawler is a registered one"""
+        name, rates = select_crawler(self.src)
+        assert name in CRAWLERS
+        assert set(rates) <= set(CRAWLERS)
+
+    def test_sources_buckets(self):
+        """concurrently crawled sources yield all their buckets"""
+        other = tempfile.mkdtemp(prefix='msrsync_testcrawl_')
+        try:
+            _create_fake_tree(other, total_entries=567, max_entries_per_level=50, max_depth=3, files_pct=90)
+            results = list(sources_buckets([self.src, other], 50, 1024**3))
+            for src in self.src, other:
+                files_nr = sum(nr for bsrc, nr, _, _ in results if bsrc == src)
+                assert files_nr == len(self._entries(crawl(src, relative=True)))
+        finally:
+            shutil.rmtree(other, onerror=rmtree_onerror)
+
+    def test_parallel_crawl_huge_directory(self, monkeypatch):
+        """a directory bigger than a crawl batch is streamed in several batches"""
+        monkeypatch.setattr(msrsync3, 'CRAWL_BATCH_ENTRIES', 16)
+        huge = os.path.join(self.src, 'huge')
+        os.mkdir(huge)
+        for idx in range(500):
+            open(os.path.join(huge, str(idx)), 'w').close()
+            if idx % 50 == 0:
+                os.mkdir(os.path.join(huge, f'dir{idx}'))
+        assert self._entries(crawl_parallel(self.src, relative=True, threads=4)) == self._reference()
+
+    def test_buckets_inside_huge_directory(self, monkeypatch):
+        """buckets are cut while a huge directory is still being listed"""
+        monkeypatch.setattr(msrsync3, 'CRAWL_BATCH_ENTRIES', 16)
+        huge = tempfile.mkdtemp(prefix='msrsync_testcrawl_')
+        try:
+            for idx in range(1000):
+                open(os.path.join(huge, str(idx)), 'w').close()
+            for crawler in 'scandir', 'parallel':
+                gen = buckets(huge, 10, 1024**3, crawler=crawler)
+                files_nr, _, bucket = next(gen)
+                gen.close()
+                assert files_nr == len(bucket) == 10
+        finally:
+            shutil.rmtree(huge, onerror=rmtree_onerror)
+
+    def test_governor_budgets(self):
+        """the governor paces the entries and the directory reads to their budgets"""
+        entries = [(0, b'/dir%d/file%d' % (idx // 10, idx), None) for idx in range(300)]
+        governor, counters, start = CrawlGovernor(stats_rate=1000), Counter(), time.monotonic()
+        assert list(governor.throttle(entries, counters)) == entries
+        assert time.monotonic() - start >= 0.15 and counters['crawl_throttled'] > 0
+        governor, counters, start = CrawlGovernor(dirs_rate=100), Counter(), time.monotonic()
+        for _ in range(30):
+            governor.opendir(counters)
+        assert time.monotonic() - start >= 0.15 and counters['crawl_throttled'] > 0
+
+    def test_governor_latency_backoff(self, monkeypatch):
+        """the governor halves the rate when the stat latency the crawler reports goes above the target"""
+        monkeypatch.setattr(msrsync3, 'CRAWL_GOVERNOR_WINDOW', 0.02)
+
+        def slow_crawl():
+            for idx in range(30):
+                time.sleep(0.002)
+                governor.sample(2 * 10**6)
+                yield 0, b'/file%d' % idx, None
+
+        governor, counters = CrawlGovernor(stats_rate=10000, latency_target=0.001), Counter()
+        assert len(list(governor.throttle(slow_crawl(), counters))) == 30
+        assert counters['crawl_backoffs'] > 0 and governor.rate < 500
+
+    def test_governor_buffered_latency(self, monkeypatch):
+        """the governor backs off on the stat latency reported by the crawler, even when its entries are buffered"""
+        monkeypatch.setattr(msrsync3, 'CRAWL_GOVERNOR_WINDOW', 0.02)
+        governor, counters = CrawlGovernor(stats_rate=10000, latency_target=0.001), Counter()
+        for _ in governor.throttle([(0, b'/file%d' % idx, None) for idx in range(30)], counters):
+            governor.sample(2 * 10**6)
+            time.sleep(0.002)
+        assert counters['crawl_backoffs'] > 0
+
+    def test_governor_crawlers(self):
+        """every crawler charges the directories it reads and reports the latency of its stat calls"""
+        dirs = len(list(os.walk(self.src)))
+        for name in 'walk', 'scandir', 'find', 'parallel', 'statx', 'io_uring':
+            governor, opened, sampled = CrawlGovernor(dirs_rate=10**9, latency_target=1.0), [], []
+            governor.opendir = lambda counters: opened.append(1)
+            governor.sample = lambda elapsed_ns, calls=1: sampled.append(calls)
+            crawler = msrsync3.get_crawler(name, counters=Counter(), governor=governor)
+            assert self._entries(crawler(self.src, relative=True)) == self._reference()
+            assert len(opened) == dirs, name
+            assert sampled, name
+
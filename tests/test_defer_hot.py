@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import time
+from .test_utils import import_msrsync3
+
+msrsync3 = import_msrsync3()
+_create_fake_tree = msrsync3._create_fake_tree
+rmtree_onerror = msrsync3.rmtree_onerror
+crawl = msrsync3.crawl
+buckets = msrsync3.buckets
+DeferredLane = msrsync3.DeferredLane
+
+
+class TestDeferHot:
+    """
+    Test the deferred lane of the files still being written during the crawl
+    """
+
+    def setup_method(self):
+        """create a temporary fake tree, aged out of the hot window"""
+        self.work = tempfile.mkdtemp(prefix='msrsync_testdeferhot_')
+        self.src = os.path.join(self.work, 'src')
+        os.mkdir(self.src)
+        _create_fake_tree(self.src, total_entries=200, max_entries_per_level=50, max_depth=3, files_pct=90)
+        past = time.time() - 3600
+        for dirpath, dirnames, filenames in os.walk(self.src):
+            for name in filenames:
+                os.utime(os.path.join(dirpath, name), (past, past))
+        self.base = os.fsencode(os.path.basename(self.src))
+
+    def teardown_method(self):
+        """remove the temporary fake tree"""
+        if os.path.exists(self.work):
+            shutil.rmtree(self.work, onerror=rmtree_onerror)
+
+    def _entries(self, lane):
+        """bucket the source through the deferred lane and return the bucketed entries"""
+        return [entry for _, _, bucket in buckets(self.src, 100, 1024**3, deferred=lane) for entry in bucket]
+
+    def test_hot_files_deferred(self):
+        """the freshly modified files are kept back, then bucketed once settled"""
+        for name in 'hot1', 'hot2':
+            with open(os.path.join(self.src, name), 'w') as hot:
+                hot.write(name)
+        lane = DeferredLane(0.2)
+        entries = self._entries(lane)
+        assert len(entries) == len(list(crawl(self.src))) - 2
+        assert self.base + b'/hot1' not in entries
+        deferred = [entry for _, _, bucket in lane.buckets(self.src, 100, 0) for entry in bucket]
+        assert sorted(deferred) == [self.base + b'/hot1', self.base + b'/hot2']
+        assert (lane.deferred, lane.settled) == (2, 2)
+
+    def test_changing_and_vanished_files(self):
+        """a file modified since the crawl is rechecked until it settles, a vanished file is dropped"""
+        changing, vanished = os.path.join(self.src, 'changing'), os.path.join(self.src, 'vanished')
+        for path in changing, vanished:
+            open(path, 'w').close()
+        lane = DeferredLane(0.1)
+        self._entries(lane)
+        os.unlink(vanished)
+        with open(changing, 'w') as hot:
+            hot.write('more data')
+        settled = lane.settle(self.src)
+        assert [rpath for _, rpath in settled] == [b'/changing']
+        assert (lane.deferred, lane.settled) == (2, 1)
@@ -1,11 +1,21 @@
 #!/usr/bin/env python
 
+import io
+import os
 import pytest
 from .test_utils import import_msrsync3
 
 msrsync3 = import_msrsync3()
 get_human_size = msrsync3.get_human_size
 human_size = msrsync3.human_size
+human_age = msrsync3.human_age
+FilterRules = msrsync3.FilterRules
+write_bucket = msrsync3.write_bucket
+Bucket = msrsync3.Bucket
+_rsync_has_option = msrsync3._rsync_has_option
+_prediff_attributes = msrsync3._prediff_attributes
+bucket_sort_key = msrsync3.bucket_sort_key
+first_extent = msrsync3.first_extent
 
 
 class TestHelpers:
@@ -42,3 +52,111 @@ class TestHelpers:
         """bad suffix"""
         val = human_size("10Q")
         assert val is None
+
+    def test_human_age(self):
+        """convert ages to seconds, days by default"""
+        assert human_age("90") == 90 * 86400
+        assert human_age("30m") == 1800
+        assert human_age("2w") == 14 * 86400
+        assert human_age("3y") is None and human_age("d") is None
+
+    def test_cache_filters(self):
+        """cache files are matched on their bytes name"""
+        filters = FilterRules().with_caches
+        for name in b'.DS_Store', b'file.swp', b'#autosave#', b'backup~', b'dir/.cache':
+            assert filters.excluded(name)
+        assert not filters.excluded(b'data.txt')
+
+    def test_filter_rules(self):
+        """the first matching rule applies, with the rsync patterns semantics"""
+        filters = FilterRules([(True, 'keep.o'), (False, '*.o'), (False, '/build/'), (False, 'a/b'), (False, 'x/***')])
+        assert filters.excluded(b'sub/file.o') and not filters.excluded(b'sub/keep.o')
+        assert filters.excluded(b'build', True) and not filters.excluded(b'build') and not filters.excluded(b'sub/build', True)
+        assert filters.excluded(b'sub/a/b') and not filters.excluded(b'sub/a/bc')
+        assert filters.excluded(b'x', True) and filters.excluded(b'x/y/z')
+        assert filters.excluded_path(b'build/keep', False)
+
+    def test_filter_options(self, tmp_path):
+        """the rules of every filter option are kept in order"""
+        rules_file = tmp_path / 'rules'
+        rules_file.write_text('# comment\n*.log\n+ important.tmp\n')
+        filters = FilterRules.from_options([('exclude-from', str(rules_file)), ('filter', '- *.tmp'), ('include', 'x'), ('filter', 'clear'), ('exclude', '*.bak')])
+        assert filters.rules == [(False, b'*.bak')]
+        filters = FilterRules.from_options([('exclude-from', str(rules_file)), ('filter', '- *.tmp')])
+        assert filters.rules == [(False, b'*.log'), (True, b'important.tmp'), (False, b'*.tmp')]
+        with pytest.raises(ValueError):
+            FilterRules.from_options([('filter', 'dir-merge .rsync-filter')])
+
+    def test_filter_rsync_rules(self):
+        """the rsync rules are anchored under the source directory"""
+        filters = FilterRules([(False, '*.o'), (True, '/keep/')])
+        assert filters.rsync_rules('src') == b'- /src/*.o\n- /src/**/*.o\n+ /src/keep/\n'
+
+    def test_write_bucket(self, tmp_path):
+        """a bucket is written as NUL terminated bytes paths"""
+        path = str(tmp_path / 'bucket')
+        write_bucket((os.open(path, os.O_WRONLY | os.O_CREAT), path), Bucket([b'a/b', b'c\xff']))
+        with open(path, 'rb') as bfile:
+            assert bfile.read() == b'a/b\0c\xff\0'
+
+    def test_bucket(self):
+        """compact bucket keeps and sorts its bytes paths"""
+        paths = [b'src/b/y', b'src/a/x', b'src/b/x', b'top']
+        for factor_prefixes in False, True:
+            bucket = Bucket(paths, factor_prefixes=factor_prefixes)
+            assert len(bucket) == 4
+            assert list(bucket) == paths
+            assert bucket[-1] == b'top' and bucket[-4] == b'src/b/y'
+            for idx in 4, -5:
+                with pytest.raises(IndexError):
+                    bucket[idx]
+            bucket.sort()
+            assert list(bucket) == sorted(paths)
+            bucket.sort(key=len)
+            assert [len(path) for path in bucket] == sorted(map(len, paths))
+
+    def test_bucket_write_to(self):
+        """compact bucket writes NUL terminated paths, with or without factored prefixes"""
+        paths = [b'src/a/x', b'src/a/y', b'src/b/z']
+        for factor_prefixes in False, True:
+            output = io.BytesIO()
+            Bucket(paths, factor_prefixes=factor_prefixes).write_to(output)
+            assert output.getvalue() == b'src/a/x\0src/a/y\0src/b/z\0'
+
+    def test_rsync_has_option(self):
+        """find short, grouped and long rsync options"""
+        assert _rsync_has_option("-aS --numeric-ids", "a", "--archive")
+        assert _rsync_has_option("-rc", "c", "--checksum")
+        assert _rsync_has_option("--checksum", "c", "--checksum")
+        assert not _rsync_has_option("-aS --numeric-ids", "c", "--checksum")
+
+    def test_prediff_attributes(self):
+        """compare the attributes preserved by the rsync options"""
+        assert _prediff_attributes("-aS --numeric-ids") == ("st_size", "st_mode", "st_uid", "st_gid")
+        assert _prediff_attributes("-rt --perms") == ("st_size", "st_mode")
+
+    def test_bucket_sort_key(self, tmp_path):
+        """buckets are sorted by physical location, the unknown locations by name after the others"""
+        root = os.fsencode(tmp_path)
+        for name in 'c', 'a', 'b':
+            (tmp_path / name).write_bytes(name.encode() * 4096)
+        os.sync()
+        paths = [b'c', b'missing', b'a', b'b']
+        assert bucket_sort_key('name', root) is None
+        for order, locate in ('inode', lambda path: os.lstat(path).st_ino), ('extent', first_extent):
+            bucket = Bucket(paths)
+            bucket.sort(bucket_sort_key(order, root))
+            located = [path for path in paths if path != b'missing' and locate(os.path.join(root, path)) is not None]
+            expected = sorted(located, key=lambda path: locate(os.path.join(root, path)))
+            assert list(bucket) == expected + sorted(set(paths) - set(located))
+
+
+    def test_first_extent_special_files(self, tmp_path, monkeypatch):
+        """only the regular files are opened to find their first extent"""
+        os.mkfifo(tmp_path / 'fifo')
+        os.symlink(tmp_path / 'fifo', tmp_path / 'link')
+        opened = []
+        monkeypatch.setattr(os, 'open', lambda path, *args: opened.append(path))
+        for path in tmp_path / 'fifo', tmp_path / 'link', tmp_path, '/dev/null':
+            assert first_extent(os.fsencode(path)) is None
+        assert opened == []
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from .test_utils import import_msrsync3
+
+msrsync3 = import_msrsync3()
+_create_fake_tree = msrsync3._create_fake_tree
+rmtree_onerror = msrsync3.rmtree_onerror
+crawl = msrsync3.crawl
+buckets = msrsync3.buckets
+Manifest = msrsync3.Manifest
+BucketError = msrsync3.BucketError
+parse_cmdline = msrsync3.parse_cmdline
+
+
+class TestManifest:
+    """
+    Test the incremental runs based on the SQLite manifest
+    """
+
+    def setup_method(self):
+        """create a temporary fake tree and manifest"""
+        self.src = tempfile.mkdtemp(prefix='msrsync_testmanifest_')
+        self.work = tempfile.mkdtemp(prefix='msrsync_testmanifest_')
+        _create_fake_tree(self.src, total_entries=500, max_entries_per_level=50, max_depth=3, files_pct=90)
+        self.manifest_path = os.path.join(self.work, 'manifest.db')
+        self.dst = os.path.join(self.work, 'dst')
+
+    def teardown_method(self):
+        """remove the temporary fake tree and manifest"""
+        for path in self.src, self.work:
+            if os.path.exists(path):
+                shutil.rmtree(path, onerror=rmtree_onerror)
+
+    def _run(self, commit=True, **kwargs):
+        """bucket the source with the manifest and return the bucketed entries and the counters"""
+        manifest = Manifest(self.manifest_path, self.dst)
+        crawl_stats = []
+        try:
+            entries = [entry for _, _, bucket in buckets(self.src, 100, 1024**3, crawl_stats=crawl_stats, manifest=manifest, **kwargs) for entry in bucket]
+            if commit:
+                manifest.commit()
+        finally:
+            manifest.close()
+        return entries, crawl_stats[0]['counters']
+
+    def _age_dirs(self):
+        """move the directories mtime an hour back, out of the racy window of the incremental crawl"""
+        past = time.time() - 3600
+        for dirpath, _, _ in os.walk(self.src):
+            os.utime(dirpath, (past, past))
+
+    def test_first_run(self):
+        """every entry is a miss on the first run"""
+        entries, counters = self._run()
+        assert len(entries) == counters['manifest_misses'] == len(list(crawl(self.src)))
+        assert counters['manifest_hits'] == 0
+
+    def test_unchanged_run(self):
+        """nothing is bucketed when nothing changed"""
+        self._run()
+        entries, counters = self._run(crawler='scandir')
+        assert entries == []
+        assert counters['manifest_hits'] == len(list(crawl(self.src)))
+
+    def test_changed_file(self):
+        """only the new and the modified files are bucketed"""
+        self._run()
+        _, rpath, st = next(entry for entry in crawl(self.src, relative=True) if entry[0] == 0)
+        os.utime(os.fsencode(self.src) + rpath, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        open(os.path.join(self.src, 'new_file'), 'w').close()
+        entries, counters = self._run()
+        base = os.fsencode(os.path.basename(self.src))
+        assert sorted(entries) == sorted([base + rpath, base + b'/new_file'])
+        assert counters['manifest_misses'] == 2
+
+    def test_uncommitted_run(self):
+        """a run that was not committed does not update the manifest"""
+        self._run(commit=False)
+        entries, _ = self._run()
+        assert len(entries) == len(list(crawl(self.src)))
+
+    def test_other_destination(self):
+        """the manifest records every destination separately"""
+        self._run()
+        self.dst += '_other'
+        entries, _ = self._run()
+        assert len(entries) == len(list(crawl(self.src)))
+
+    def test_prune_unchanged_dirs(self):
+        """no directory is read again when nothing changed"""
+        self._age_dirs()
+        self._run(prune_dirs=True)
+        entries, counters = self._run(prune_dirs=True)
+        assert entries == []
+        assert counters['manifest_pruned_dirs'] == len(list(os.walk(self.src)))
+        assert counters['manifest_scanned_dirs'] == 0
+
+    def test_prune_new_file(self):
+        """only the directory where a file was created is read again"""
+        self._age_dirs()
+        self._run(prune_dirs=True)
+        deepest = max((dirpath for dirpath, _, _ in os.walk(self.src)), key=lambda dirpath: dirpath.count(os.sep))
+        open(os.path.join(deepest, 'new_file'), 'w').close()
+        entries, counters = self._run(prune_dirs=True)
+        assert entries == [os.fsencode(os.path.join(os.path.basename(self.src), os.path.relpath(deepest, self.src), 'new_file'))]
+        assert counters['manifest_scanned_dirs'] == 1
+
+    def test_prune_removed_dir(self):
+        """a removed directory is forgotten and a recreated one is read again"""
+        self._age_dirs()
+        self._run(prune_dirs=True)
+        subdir = next(entry.path for entry in os.scandir(self.src) if entry.is_dir(follow_symlinks=False))
+        shutil.rmtree(subdir)
+        self._run(prune_dirs=True)
+        os.mkdir(subdir)
+        open(os.path.join(subdir, 'new_file'), 'w').close()
+        entries, counters = self._run(prune_dirs=True)
+        assert entries == [os.fsencode(os.path.join(os.path.basename(self.src), os.path.basename(subdir), 'new_file'))]
+        assert counters['manifest_scanned_dirs'] == 2
+
+    def test_new_hardlink(self):
+        """a new link to an unchanged inode is bucketed with its other links"""
+        first = os.path.join(self.src, 'linked')
+        open(first, 'w').close()
+        self._run(hardlinks=True)
+        os.link(first, os.path.join(self.src, 'new_link'))
+        entries, _ = self._run(hardlinks=True)
+        base = os.fsencode(os.path.basename(self.src))
+        assert sorted(entries) == [base + b'/linked', base + b'/new_link']
+
+    def test_failed_bucket(self, monkeypatch):
+        """a run whose buckets cannot be written fails and does not update the manifest"""
+
+        def write_bucket(*args):
+            raise BucketError("injected failure")
+
+        monkeypatch.setattr(msrsync3, 'write_bucket', write_bucket)
+        os.mkdir(self.dst)
+        options, srcs, dest = parse_cmdline(['msrsync', '--manifest', self.manifest_path, self.src, self.dst])
+        assert msrsync3.msrsync(options, srcs, dest) > 0
+        monkeypatch.undo()
+        entries, _ = self._run()
+        assert len(entries) == len(list(crawl(self.src)))
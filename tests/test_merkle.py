@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from .test_utils import import_msrsync3
+
+msrsync3 = import_msrsync3()
+_create_fake_tree = msrsync3._create_fake_tree
+rmtree_onerror = msrsync3.rmtree_onerror
+buckets = msrsync3.buckets
+merkle_tree = msrsync3.merkle_tree
+merkle_diff = msrsync3.merkle_diff
+Manifest = msrsync3.Manifest
+ManifestMerkleTree = msrsync3.ManifestMerkleTree
+
+
+class TestMerkle:
+    """
+    Test the Merkle tree comparisons
+    """
+
+    def setup_method(self):
+        """create a temporary fake tree and its copy"""
+        self.work = tempfile.mkdtemp(prefix='msrsync_testmerkle_')
+        self.src = os.path.join(self.work, 'src')
+        self.dst = os.path.join(self.work, 'dst')
+        os.mkdir(self.src)
+        _create_fake_tree(self.src, total_entries=500, max_entries_per_level=50, max_depth=3, files_pct=80)
+        shutil.copytree(self.src, self.dst, symlinks=True)
+
+    def teardown_method(self):
+        """remove the temporary fake tree and its copy"""
+        if os.path.exists(self.work):
+            shutil.rmtree(self.work, onerror=rmtree_onerror)
+
+    def _subdir(self, depth):
+        """return a directory of the source at depth"""
+        return next(dirpath for dirpath, _, _ in os.walk(self.src) if dirpath != self.src and os.path.relpath(dirpath, self.src).count(os.sep) == depth - 1)
+
+    def test_crawlers_agree(self):
+        """the tree hashes do not depend on the crawler"""
+        trees = [merkle_tree(self.src, crawler) for crawler in ('walk', 'find', 'parallel')]
+        assert trees[0].node(b'') == trees[1].node(b'') == trees[2].node(b'')
+
+    def test_identical_trees(self):
+        """only the root is compared when the trees are identical"""
+        counters = Counter()
+        assert list(merkle_diff(merkle_tree(self.src), merkle_tree(self.dst), counters)) == []
+        assert counters['merkle_compared_dirs'] == 1
+
+    def test_differing_trees(self):
+        """changed, added and removed directories are reported"""
+        subdir = self._subdir(1)
+        open(os.path.join(subdir, 'new_file'), 'w').close()
+        os.mkdir(os.path.join(self.src, 'new_dir'))
+        os.mkdir(os.path.join(self.dst, 'old_dir'))
+        diff = sorted(merkle_diff(merkle_tree(self.src), merkle_tree(self.dst)))
+        rsubdir = os.fsencode(os.path.relpath(subdir, self.src))
+        assert diff == [('added', b'new_dir'), ('changed', rsubdir), ('removed', b'old_dir')]
+
+    def _record(self, manifest, **kwargs):
+        """bucket the source with the manifest, commit it and return the recorded tree"""
+        for _ in buckets(self.src, 100, 1024**3, manifest=manifest, **kwargs):
+            pass
+        manifest.commit()
+        return ManifestMerkleTree(manifest, os.fsencode(os.path.abspath(self.src)))
+
+    def test_recorded_tree(self):
+        """the tree recorded in the manifest matches the crawled one"""
+        manifest = Manifest(os.path.join(self.work, 'manifest.db'), self.dst)
+        try:
+            recorded = self._record(manifest)
+            assert list(merkle_diff(merkle_tree(self.src), recorded)) == []
+            open(os.path.join(self._subdir(1), 'new_file'), 'w').close()
+            rsubdir = os.fsencode(os.path.relpath(self._subdir(1), self.src))
+            assert list(merkle_diff(merkle_tree(self.src), recorded)) == [('changed', rsubdir)]
+        finally:
+            manifest.close()
+
+    def test_recorded_tree_since_last(self):
+        """the tree recorded by a run since the last one holds the unchanged entries too"""
+        manifest = Manifest(os.path.join(self.work, 'manifest.db'), self.dst)
+        try:
+            self._record(manifest)
+            since_ns = time.time_ns()
+            time.sleep(0.05)
+            with open(os.path.join(self._subdir(1), 'new_file'), 'w') as new_file:
+                new_file.write('data')
+            recorded = self._record(manifest, since={self.src: since_ns})
+            assert list(merkle_diff(merkle_tree(self.src), recorded)) == []
+        finally:
+            manifest.close()
+
+    def test_recorded_tree_size_age(self):
+        """the tree recorded by a run with size and age filters holds the filtered out entries too"""
+        manifest = Manifest(os.path.join(self.work, 'manifest.db'), self.dst)
+        try:
+            for size_age in dict(min_size=5), dict(max_size=0, older_than_ns=time.time_ns() - 3600 * 10**9):
+                recorded = self._record(manifest, size_age=size_age)
+                assert list(merkle_diff(merkle_tree(self.src), recorded)) == []
+        finally:
+            manifest.close()
@@ -116,3 +116,96 @@ class TestOptionsParser:
             cmdline = shlex.split("""msrsync -r "-a --numeric-ids --delete" src dst""")
             parse_cmdline(cmdline)
         assert excinfo.value.code == EOPTION_PARSER
+
+    def test_crawl_threads(self):
+        """parse cmdline with a crawl threads number"""
+        cmdline = shlex.split("msrsync --crawl-threads 8 src dst")
+        opt, _, _ = parse_cmdline(cmdline)
+        assert opt.crawl_threads == 8
+
+    def test_bad_crawl_threads(self):
+        """parse cmdline with a null crawl threads number"""
+        with pytest.raises(SystemExit) as excinfo:
+            cmdline = shlex.split("msrsync --crawl-threads 0 src dst")
+            parse_cmdline(cmdline)
+        assert excinfo.value.code == EOPTION_PARSER
+
+    def test_unlimited_size(self):
+        """parse cmdline with a 0 size (no size limit)"""
+        cmdline = shlex.split("msrsync -s 0 src dst")
+        opt, _, _ = parse_cmdline(cmdline)
+        assert opt.size == 0
+
+    def test_crawler(self):
+        """parse cmdline with a crawler backend"""
+        cmdline = shlex.split("msrsync --crawler auto src dst")
+        opt, _, _ = parse_cmdline(cmdline)
+        assert opt.crawler == "auto"
+
+    def test_bad_crawler(self):
+        """parse cmdline with an unknown crawler backend"""
+        with pytest.raises(SystemExit) as excinfo:
+            cmdline = shlex.split("msrsync --crawler nope src dst")
+            parse_cmdline(cmdline)
+        assert excinfo.value.code == EOPTION_PARSER
+
+    def test_prune_unchanged_dirs(self):
+        """parse cmdline with directory pruning"""
+        cmdline = shlex.split("msrsync --manifest db --prune-unchanged-dirs src dst")
+        opt, _, _ = parse_cmdline(cmdline)
+        assert opt.prune_unchanged_dirs
+
+    def test_watch(self):
+        """parse cmdline with the watch mode"""
+        cmdline = shlex.split("msrsync --watch --watch-delay 0.5 src dst")
+        opt, _, _ = parse_cmdline(cmdline)
+        assert opt.watch and opt.watch_delay == 0.5
+
+    def test_watch_with_manifest(self):
+        """parse cmdline with the watch mode and a manifest"""
+        with pytest.raises(SystemExit) as excinfo:
+            cmdline = shlex.split("msrsync --watch --manifest db src dst")
+            parse_cmdline(cmdline)
+        assert excinfo.value.code == EOPTION_PARSER
+
+    def test_prune_unchanged_dirs_without_manifest(self):
+        """parse cmdline with directory pruning but no manifest"""
+        with pytest.raises(SystemExit) as excinfo:
+            cmdline = shlex.split("msrsync --prune-unchanged-dirs src dst")
+            parse_cmdline(cmdline)
+        assert excinfo.value.code == EOPTION_PARSER
+
+    def test_one_file_system(self):
+        """the crawl stays on the sources file systems with --one-file-system or rsync -x"""
+        for cmdline in "msrsync --one-file-system src dst", "msrsync --rsync '-ax --numeric-ids' src dst":
+            opt, _, _ = parse_cmdline(shlex.split(cmdline))
+            assert opt.one_file_system and opt.filters.one_file_system
+        opt, _, _ = parse_cmdline(shlex.split("msrsync --rsync '-aX' src dst"))
+        assert not opt.one_file_system and not opt.filters
+
+    def test_size_age_filters(self):
+        """parse cmdline with the size and age filters"""
+        cmdline = shlex.split("msrsync --min-size 1K --max-size 2M --newer-than 12h --older-than 90 src dst")
+        opt, _, _ = parse_cmdline(cmdline)
+        assert (opt.min_size, opt.max_size, opt.newer_than, opt.older_than) == (1024, 2 * 1024**2, 12 * 3600, 90 * 86400)
+
+    def test_bad_age(self):
+        """parse cmdline with an invalid age"""
+        with pytest.raises(SystemExit) as excinfo:
+            cmdline = shlex.split("msrsync --older-than 3y src dst")
+            parse_cmdline(cmdline)
+        assert excinfo.value.code == EOPTION_PARSER
+
+    def test_since_last(self):
+        """parse cmdline with the since last run mode"""
+        cmdline = shlex.split("msrsync --since-last state.json --since-overlap 5 src dst")
+        opt, _, _ = parse_cmdline(cmdline)
+        assert opt.since_last == "state.json" and opt.since_overlap == 5
+
+    def test_defer_hot(self):
+        """parse cmdline with the deferred lane of the hot files"""
+        opt, _, _ = parse_cmdline(shlex.split("msrsync --defer-hot 2.5 src dst"))
+        assert opt.defer_hot == 2.5
+        with pytest.raises(SystemExit) as excinfo:
+            parse_cmdline(shlex.split("msrsync --defer-hot 0 src dst"))
+        assert excinfo.value.code == EOPTION_PARSER
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+from .test_utils import import_msrsync3
+
+msrsync3 = import_msrsync3()
+_create_fake_tree = msrsync3._create_fake_tree
+rmtree_onerror = msrsync3.rmtree_onerror
+crawl = msrsync3.crawl
+buckets = msrsync3.buckets
+
+
+class TestPrediff:
+    """
+    Test the source versus destination pre-diff
+    """
+
+    def setup_method(self):
+        """create a temporary fake tree and its copy"""
+        self.work = tempfile.mkdtemp(prefix='msrsync_testprediff_')
+        self.src = os.path.join(self.work, 'src')
+        self.dst = os.path.join(self.work, 'dst')
+        os.mkdir(self.src)
+        _create_fake_tree(self.src, total_entries=500, max_entries_per_level=50, max_depth=3, files_pct=90)
+        shutil.copytree(self.src, os.path.join(self.dst, 'src'), symlinks=True)
+
+    def teardown_method(self):
+        """remove the temporary fake tree and its copy"""
+        if os.path.exists(self.work):
+            shutil.rmtree(self.work, onerror=rmtree_onerror)
+
+    def _run(self, attributes=("st_size",)):
+        """bucket the source with the pre-diff and return the bucketed entries and the counters"""
+        crawl_stats = []
+        entries = [
+            entry
+            for _, _, bucket in buckets(
+                self.src, 100, 1024**3, crawl_stats=crawl_stats, prediff_dest=self.dst, prediff_attributes=attributes
+            )
+            for entry in bucket
+        ]
+        return entries, crawl_stats[0]['counters']
+
+    def test_identical_copy(self):
+        """only the directories are bucketed when the destination is an identical copy"""
+        entries, counters = self._run()
+        files = [rpath for _, rpath, st in crawl(self.src, relative=True) if os.path.isfile(os.fsencode(self.src) + rpath)]
+        assert counters['prediff_compared'] == len(list(crawl(self.src)))
+        assert counters['prediff_identical'] == len(files)
+        assert len(entries) == counters['prediff_compared'] - counters['prediff_identical']
+
+    def test_changed_files(self):
+        """the new, resized, touched and chmod-ed files are bucketed"""
+        files = sorted(rpath for _, rpath, _ in crawl(self.src, relative=True) if os.path.isfile(os.fsencode(self.src) + rpath))
+        src = os.fsencode(self.src)
+        with open(src + files[0], 'ab') as fileobj:
+            fileobj.write(b'more')
+        os.utime(src + files[1], (0, 0))
+        os.chmod(src + files[2], 0o644)
+        open(os.path.join(self.src, 'new_file'), 'w').close()
+        entries, counters = self._run(("st_size", "st_mode"))
+        changed = {b'src' + rpath for rpath in files[:3]} | {b'src/new_file'}
+        assert changed <= set(entries)
+        assert counters['prediff_identical'] == len(files) - 3
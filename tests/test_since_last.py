@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+import json
+import os
+import pytest
+import shutil
+import tempfile
+import time
+from .test_utils import import_msrsync3
+
+msrsync3 = import_msrsync3()
+_create_fake_tree = msrsync3._create_fake_tree
+rmtree_onerror = msrsync3.rmtree_onerror
+crawl = msrsync3.crawl
+buckets = msrsync3.buckets
+SinceLastState = msrsync3.SinceLastState
+
+
+class TestSinceLast:
+    """
+    Test the incremental runs based on the start time of the last successful run
+    """
+
+    def setup_method(self):
+        """create a temporary fake tree"""
+        self.work = tempfile.mkdtemp(prefix='msrsync_testsincelast_')
+        self.src = os.path.join(self.work, 'src')
+        os.mkdir(self.src)
+        _create_fake_tree(self.src, total_entries=500, max_entries_per_level=50, max_depth=3, files_pct=90)
+        self.state_path = os.path.join(self.work, 'state.json')
+
+    def teardown_method(self):
+        """remove the temporary fake tree"""
+        if os.path.exists(self.work):
+            shutil.rmtree(self.work, onerror=rmtree_onerror)
+
+    def test_state(self):
+        """the last run of every source and destination pair is recorded, the trailing slash matters"""
+        state = SinceLastState(self.state_path)
+        assert state.last_run(self.src, 'dst') is None
+        state.record([self.src, self.src + os.sep], 'dst', 42)
+        SinceLastState(self.state_path).record([self.src], 'other', 43)
+        state.record([self.src], 'dst', 44)
+        state = SinceLastState(self.state_path)
+        assert state.last_run(self.src, 'dst') == 44
+        assert state.last_run(self.src + os.sep, 'dst') == 42
+        assert state.last_run(self.src, 'other') == 43
+
+    def test_corrupted_state(self):
+        """an unreadable state is an error"""
+        with open(self.state_path, 'w') as state_file:
+            json.dump({'runs': [{'source': 'src'}]}, state_file)
+        with pytest.raises(msrsync3.SinceLastError):
+            SinceLastState(self.state_path)
+
+    def test_changed_entries(self):
+        """only the entries created, modified or renamed since the last run are bucketed"""
+        time.sleep(0.05)
+        since_ns = time.time_ns()
+        time.sleep(0.05)
+        files = sorted(rpath for _, rpath, _ in crawl(self.src, relative=True) if os.path.isfile(os.fsencode(self.src) + rpath))
+        src = os.fsencode(self.src)
+        os.rename(src + files[0], src + files[0] + b'.renamed')
+        with open(src + files[1], 'ab') as fileobj:
+            fileobj.write(b'more')
+        open(os.path.join(self.src, 'new_file'), 'w').close()
+        crawl_stats = []
+        entries = [entry for _, _, bucket in buckets(self.src, 100, 0, crawl_stats=crawl_stats, since={self.src: since_ns}) for entry in bucket]
+        assert sorted(entries) == sorted([b'src' + files[0] + b'.renamed', b'src' + files[1], b'src/new_file'])
+        counters = crawl_stats[0]['counters']
+        assert counters['since_changed'] == 3
+        assert counters['since_unchanged'] == len(list(crawl(self.src))) - 3
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+import errno
+import os
+import shutil
+import tempfile
+from .test_utils import import_msrsync3
+
+msrsync3 = import_msrsync3()
+rmtree_onerror = msrsync3.rmtree_onerror
+SourcesWatcher = msrsync3.SourcesWatcher
+
+
+class TestWatch:
+    """
+    Test the inotify watches of the --watch mode
+    """
+
+    def setup_method(self):
+        """create a temporary tree"""
+        self.src = tempfile.mkdtemp(prefix='msrsync_testwatch_')
+        os.makedirs(os.path.join(self.src, 'sub', 'subsub'))
+        os.mkdir(os.path.join(self.src, 'other'))
+
+    def teardown_method(self):
+        """remove the temporary tree"""
+        if os.path.exists(self.src):
+            shutil.rmtree(self.src, onerror=rmtree_onerror)
+
+    def _changes(self, watcher):
+        """return the paths reported by the watcher, relative to the source"""
+        return sorted(os.path.relpath(os.fsdecode(path), self.src) for _, path in watcher.changes(1.0))
+
+    def test_changes(self):
+        """created, modified and moved entries are reported, new directories are watched"""
+        watcher = SourcesWatcher([self.src])
+        try:
+            watcher.start()
+            open(os.path.join(self.src, 'sub', 'subsub', 'file'), 'w').close()
+            os.mkdir(os.path.join(self.src, 'new'))
+            assert self._changes(watcher) == ['new', os.path.join('sub', 'subsub', 'file')]
+            with open(os.path.join(self.src, 'new', 'file'), 'w') as fileobj:
+                fileobj.write('data')
+            os.rename(os.path.join(self.src, 'sub', 'subsub', 'file'), os.path.join(self.src, 'other', 'moved'))
+            assert self._changes(watcher) == [os.path.join('new', 'file'), os.path.join('other', 'moved')]
+        finally:
+            watcher.close()
+
+    def test_watches_limit(self):
+        """the subtrees beyond the watches limit are left for rescans"""
+        watcher = SourcesWatcher([self.src])
+        add_watch = watcher.inotify.add_watch
+
+        def limited_add_watch(path, mask):
+            if os.path.basename(path) == b'sub':
+                raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+            return add_watch(path, mask)
+
+        watcher.inotify.add_watch = limited_add_watch
+        try:
+            watcher.start()
+            assert watcher.unwatched == [(0, os.path.join(os.fsencode(self.src), b'sub'))]
+            open(os.path.join(self.src, 'sub', 'subsub', 'file'), 'w').close()
+            open(os.path.join(self.src, 'other', 'file'), 'w').close()
+            assert self._changes(watcher) == [os.path.join('other', 'file')]
+        finally:
+            watcher.close()